@@ -237,10 +237,6 @@ define([
                 { alert: alert, canned: this.settings.get("canned_queries") }
             );
 
-            _.each(alert.work_log, function(entry) {
-                entry.ftime = moment(new Date(entry.time * 1000)).format('YYYY-MM-DD HH:mm:ss');
-            });
-
             var analysts = this.settings.get("analysts");
             var severities = this.settings.get("severities");
             var threats = Object.keys(this.settings.get("threatsToActions")).sort();
@@ -304,20 +300,7 @@ define([
                 <thead> \
                     <tr><th class="alert-time">Time</th><th class="alert-action">Action</th><th class="alert-analyst">Analyst</th><th class="alert-notes">Notes</th><th class="alert-worklog-data">Extra</th></tr> \
                 </thead> \
-                <tbody> \
-                <% for(var i = 0; i < alert.work_log.length; i++) { var entry=alert.work_log[i]; %> \
-                    <tr> \
-                        <td class="alert-time"><%- entry.ftime %></td> \
-                        <td class="alert-action"><%- entry.action %></td> \
-                        <td class="alert-analyst"><%- entry.analyst %></td> \
-                        <td class="alert-notes"><%- entry.notes %></td> \
-                        <% if (Object.keys(entry.data).length !== 0) {%> \
-                        <td class="alert-worklog-data"><%- JSON.stringify(entry.data) %></td> \
-                        <% } else { %> \
-                        <td class="alert-worklog-data"></td> \
-                        <% } %> \
-                    </tr> \
-                <% } %> \
+                <tbody id="work-log-<%- alert._key %>"> \
                 </tbody> \
                 </table></div>',
                 {
@@ -333,6 +316,43 @@ define([
             return '<div class="alert-expanded">' + dataHtml + workLogHtml + '</div>';
         },
 
+        // Fetch the work log of the alert from the alert_work_log collection once its row is expanded, merge it with
+        // the entries stored inside alerts created before that collection and render it most recent first
+        renderWorkLog: function(alert) {
+            this.service.request(
+                "storage/collections/data/alert_work_log",
+                "GET",
+                { query: JSON.stringify({ alert_key: alert._key }), sort: "time:-1" },
+                null,
+                null,
+                {"Content-Type": "application/json"},
+                function(err, response) {
+                    var entries = (response && response.data) ? response.data : [];
+                    entries = _.sortBy(entries.concat(alert.work_log || []), function(entry) { return -entry.time; });
+                    _.each(entries, function(entry) {
+                        entry.ftime = moment(new Date(entry.time * 1000)).format('YYYY-MM-DD HH:mm:ss');
+                    });
+                    var rowsHtml = _.template(
+                        '<% for(var i = 0; i < entries.length; i++) { var entry=entries[i]; %> \
+                            <tr> \
+                                <td class="alert-time"><%- entry.ftime %></td> \
+                                <td class="alert-action"><%- entry.action %></td> \
+                                <td class="alert-analyst"><%- entry.analyst %></td> \
+                                <td class="alert-notes"><%- entry.notes %></td> \
+                                <% if (entry.data && Object.keys(entry.data).length !== 0) {%> \
+                                <td class="alert-worklog-data"><%- JSON.stringify(entry.data) %></td> \
+                                <% } else { %> \
+                                <td class="alert-worklog-data"></td> \
+                                <% } %> \
+                            </tr> \
+                        <% } %>',
+                        { entries: entries }
+                    );
+                    $('#work-log-' + alert._key).html(rowsHtml);
+                }
+            );
+        },
+
         // Override this method to put the Splunk data into the view
         updateView: function(viz, data) {
             // Print the data object to the console
@@ -403,6 +423,7 @@ define([
                     var data = row.data();
                     var key = data['kv_key'];
                     row.child(that.formatExpandedRow(data)).show();
+                    that.renderWorkLog(JSON.parse(data['data']));
                     var threatActionSelectId = "threat-action-" + key;
                     var threatActionSelect;
                     // clean up previous backbone view if it exists
@@ -615,7 +636,7 @@ define([
             });
         },
 
-        // Update a single alert
+        // Update a single alert, the work log entry is appended to the alert_work_log collection once the alert is saved
         updateAlert: function(key, status, username, severity, entry, onComplete) {
             var that = this;
             this.service.request(
@@ -628,7 +649,6 @@ define([
                 function(err, response) { 
                     if (response && 'data' in response) {
                         var record = response.data;
-                        record.work_log.unshift(entry);
                         if (typeof status !== "undefined") {
                             record.status = status;
                         }
@@ -638,6 +658,9 @@ define([
                         if (typeof severity !== "undefined") {
                             record.severity = severity;
                         }
+                        // the version tells concurrent updatealerts searches that the alert changed since they read it
+                        record.version = (record.version || 0) + 1;
+                        record.revision = Math.random().toString(16).slice(2) + Date.now().toString(16);
                         that.service.request(
                             "storage/collections/data/alerts/" + key,
                             "POST",
@@ -646,7 +669,20 @@ define([
                             JSON.stringify(record),
                             {"Content-Type": "application/json"},
                             function(err, response) {
-                                onComplete(err, response);
+                                if (err) {
+                                    onComplete(err, response);
+                                    return;
+                                }
+                                that.service.request(
+                                    "storage/collections/data/alert_work_log",
+                                    "POST",
+                                    null,
+                                    null,
+                                    JSON.stringify(_.extend({}, entry, { alert_key: String(key) })),
+                                    {"Content-Type": "application/json"},
+                                    function(err, response) {
+                                        onComplete(err, response);
+                                    });
                             });
                     } else {
                         onComplete(err, response);
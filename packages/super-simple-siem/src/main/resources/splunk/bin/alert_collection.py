@@ -17,14 +17,254 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import sys, json
-from splunklib.client import connect
-from splunklib.binding import HTTPError
+import sys, json, hashlib, itertools, uuid, re, gzip
+from collections import OrderedDict
+from splunklib.client import connect, KVStoreCollection
+from splunklib.binding import HTTPError, pooled_handler
+from splunklib.data import record as state_record
 from utils import parse
 import time
 import logging
 import os.path
 
+# keep-alive connections to splunkd shared by all the AlertCollection of the process (and the parallel_query
+# threads, whose maximum is the pool size)
+http_handler = pooled_handler(pool_size=16)
+
+# services by (session_key, app), connect() with a session key does not call splunkd so this only saves the
+# objects, but every AlertCollection of the process shares them
+_services = {}
+
+def service_for(session_key, app):
+    if (session_key, app) not in _services:
+        _services[(session_key, app)] = connect(token=session_key, app=app, handler=http_handler)
+    return _services[(session_key, app)]
+
+# [constants] of super_simple_siem.conf as layered by splunkd (system, app and deployer pushed settings), read over
+# REST at most once per CONSTANTS_TTL seconds by the process.
+CONSTANTS_TTL = 300
+_constants = {'expires': 0, 'values': {}}
+
+def siem_constants(service):
+    now = time.time()
+    if now >= _constants['expires']:
+        _constants['values'] = dict(service.confs['super_simple_siem']['constants'].content)
+        _constants['expires'] = now + CONSTANTS_TTL
+    return _constants['values']
+
+# stable digest of the alert type, entity, time and data (independent of the key order of data).
+# it is stored in the dedupe_key field of the alerts so that duplicates are found with an indexed lookup.
+def dedupe_key(alert_record):
+    canonical = json.dumps(
+        [alert_record['type'], alert_record['entity'], float(alert_record['time']), alert_record['data']],
+        sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+# entry of the work log of an alert, stored in the work log collection with the _key of the alert in alert_key.
+def work_log_entry(action, notes=None, data=None, analyst=None, alert_key=None):
+    entry = {'time': time.time(), 'action': action, 'notes': notes, 'data': data or {}, 'analyst': analyst}
+    if alert_key:
+        entry['alert_key'] = alert_key
+    return entry
+
+# next version of an alert about to be written, with a new revision token that tells whose write is stored.
+def new_revision(alert_record):
+    alert_record['version'] = alert_record.get('version', 0) + 1
+    alert_record['revision'] = uuid.uuid4().hex
+    return alert_record['revision']
+
+# KV store field names cannot contain . or $. the cleaned names are memoized, the same fields come on every row of a
+# search; the memo is emptied when it reaches FIELD_NAMES_MEMO_SIZE names.
+FIELD_NAMES_MEMO_SIZE = 10000
+_invalid_field_chars = re.compile('[.$]')
+_field_names = {}
+
+def fix_field_name(field_name):
+    fixed = _field_names.get(field_name)
+    if fixed is None:
+        if len(_field_names) >= FIELD_NAMES_MEMO_SIZE:
+            _field_names.clear()
+        fixed = _field_names[field_name] = _invalid_field_chars.sub('', field_name)
+    return fixed
+
+# (field, cleaned name) pairs of the fields copied into the alert data, by the field names of the record and whether
+# the fields starting with _ are skipped. the rows of a search have the same fields so the plan is made once.
+_data_plans = {}
+
+def alert_data(record, skip_internal=True):
+    names = tuple(record)
+    plan = _data_plans.get((names, skip_internal))
+    if plan is None:
+        if len(_data_plans) >= FIELD_NAMES_MEMO_SIZE:
+            _data_plans.clear()
+        plan = _data_plans[(names, skip_internal)] = [(name, fix_field_name(name)) for name in names
+            if not (skip_internal and name.startswith('_'))]
+    return {fixed: record[name] for name, fixed in plan}
+
+# time alert_data against the former per record comprehension on a 200 field record of a search.
+def benchmark_alert_data(count=10000):
+    import timeit
+    record = OrderedDict([('_time', '1500000000.000'), ('_raw', 'x' * 500), ('_cd', '1:2'), ('_serial', '0')])
+    for i in range(196):
+        record['field%d.%s' % (i, 'name' if i % 3 else '$x')] = 'value %d' % i
+
+    def former(record):
+        return {re.sub('[.$]', '', key): value for key, value in record.items() if key[0] != '_'}
+
+    assert former(record) == alert_data(record)
+    for name, build in [('alert_data', alert_data), ('re.sub per field', former)]:
+        seconds = min(timeit.repeat(lambda: build(record), number=count, repeat=3)) / count
+        print('%-18s %d fields %8.1f us per record' % (name, len(record), seconds * 1e6))
+
+# constraints a KV store query puts on each field: 'eq' for equality (or a set of equalities), 'range' for a range.
+# only conjunctions are analysed, an $or that is not a set of equalities on one field constrains nothing.
+def query_constraints(query):
+    constraints = {}
+    def merge(more):
+        for field, kind in more.items():
+            if constraints.get(field) != 'eq':
+                constraints[field] = kind
+    for key, value in query.items():
+        if key == '$and':
+            for clause in value:
+                merge(query_constraints(clause))
+        elif key == '$or':
+            alternatives = [query_constraints(clause) for clause in value]
+            fields = set(field for alternative in alternatives for field in alternative)
+            if len(fields) == 1 and all(alternative == {f: 'eq'} for alternative in alternatives for f in fields):
+                merge(alternatives[0])
+        elif key.startswith('$'):
+            continue
+        elif isinstance(value, dict):
+            if '$in' in value:
+                merge({key: 'eq'})
+            elif set(value) & set(['$gt', '$gte', '$lt', '$lte']):
+                merge({key: 'range'})
+        else:
+            merge({key: 'eq'})
+    return constraints
+
+# the accelerated field (name, fields used) that serves query best: the index with the longest prefix of
+# equality fields, optionally followed by one range field. (None, []) means a collection scan.
+def index_for_query(query, indexes):
+    constraints = query_constraints(query)
+    best = (None, [])
+    for name, fields in indexes.items():
+        used = []
+        for field in fields:
+            if constraints.get(field) == 'eq':
+                used.append(field)
+            elif constraints.get(field) == 'range':
+                used.append(field)
+                break
+            else:
+                break
+        if len(used) > len(best[1]) or (used and len(used) == len(best[1]) and len(fields) < len(indexes[best[0]])):
+            best = (name, used)
+    return best
+
+# estimated fraction of the alerts matching one value of a list() filter, used to put the most selective
+# clauses first: an entity matches a handful of alerts while a status matches a large share of the collection.
+LIST_FILTER_SELECTIVITY = {
+    'entity': 0.001,
+    'type': 0.05,
+    'analyst': 0.1,
+    'severity': 0.25,
+    'status': 0.35
+}
+
+# query for list(): filters maps a field to the accepted values (empty for no filter). one value gives an
+# equality, several values an $in, the time bounds fold into one range clause that comes last. clauses are
+# ordered by estimated selectivity, a single clause is returned as is and no clause gives {}.
+def plan_list_query(filters, earliest_time=None, latest_time=None):
+    def estimate(field):
+        return (min(1.0, LIST_FILTER_SELECTIVITY.get(field, 1.0) * len(filters[field])), field)
+    clauses = []
+    for field in sorted((f for f in filters if filters[f]), key=estimate):
+        values = []
+        for value in filters[field]:
+            if value not in values:
+                values.append(value)
+        if len(values) == 1:
+            clauses.append({field: values[0]})
+        else:
+            clauses.append({field: {'$in': values}})
+    time_range = {}
+    if earliest_time:
+        time_range['$gte'] = earliest_time
+    if latest_time:
+        time_range['$lt'] = latest_time
+    if time_range:
+        clauses.append({'time': time_range})
+    if len(clauses) > 1:
+        return {'$and': clauses}
+    elif clauses:
+        return clauses[0]
+    else:
+        return {}
+
+# seconds of a combine window: a number followed by a unit (30m, 4 hours, 2d, 1week) or an ISO-8601 duration in
+# weeks, days, hours, minutes and seconds (PT90M, P1DT12H, P2W). years and months have no fixed length and are
+# rejected, as is anything else, with a ValueError.
+WINDOW_UNITS = [
+    ('s', 1), ('sec', 1), ('secs', 1), ('second', 1), ('seconds', 1),
+    ('m', 60), ('min', 60), ('mins', 60), ('minute', 60), ('minutes', 60),
+    ('h', 3600), ('hour', 3600), ('hours', 3600),
+    ('d', 86400), ('day', 86400), ('days', 86400),
+    ('w', 604800), ('week', 604800), ('weeks', 604800)]
+_window_units = dict(WINDOW_UNITS)
+_simple_window = re.compile(r'^(\d+(?:\.\d+)?)\s*([a-z]+)$')
+_iso_window = re.compile(
+    r'^P(?:(?P<w>\d+(?:\.\d+)?)W)?(?:(?P<d>\d+(?:\.\d+)?)D)?'
+    r'(?:T(?:(?P<h>\d+(?:\.\d+)?)H)?(?:(?P<m>\d+(?:\.\d+)?)M)?(?:(?P<s>\d+(?:\.\d+)?)S)?)?$')
+
+def window_seconds(window):
+    text = window.strip()
+    simple = _simple_window.match(text.lower())
+    if simple and simple.group(2) in _window_units:
+        seconds = float(simple.group(1)) * _window_units[simple.group(2)]
+    else:
+        iso = _iso_window.match(text.upper())
+        if not iso or not any(iso.groupdict().values()) or text.upper().endswith('T'):
+            raise ValueError('Cannot parse combine_window "%s", use for instance 30m, 4h, 2d, 1w or PT90M' % window)
+        seconds = sum(float(iso.group(unit)) * _window_units[unit] for unit in 'wdhms' if iso.group(unit))
+    if seconds <= 0:
+        raise ValueError('combine_window "%s" must be longer than 0 seconds' % window)
+    return seconds
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    elif isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+# how new alerts are combined with existing ones, parsed once from the combine and combine_window options:
+# an alert is combined with an open or assigned alert of the same type and entity within window seconds whose data
+# has the same values for the combine fields.
+class CombinePolicy:
+    def __init__(self, combine, combine_window):
+        self.fields = tuple(f.strip() for f in combine.split(',') if f.strip())
+        if not self.fields:
+            raise ValueError('combine must name at least one field')
+        self.window = window_seconds(combine_window)
+
+    # values of the combine fields in the data of an alert, multivalue fields as tuples so that the key is hashable
+    def key(self, data):
+        return tuple(_hashable(data.get(f)) for f in self.fields)
+
+    def __str__(self):
+        return 'combine="%s",combine_window=%d' % (','.join(self.fields), self.window)
+
+    def __eq__(self, other):
+        return isinstance(other, CombinePolicy) and (self.fields, self.window) == (other.fields, other.window)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.fields, self.window))
+
 # This is used to pass information to log things in context as well as report messages.
 class SearchContext:
 
@@ -42,30 +282,62 @@ class SearchContext:
 class AlertCollection:
     app_name = 'super_simple_siem'
     coll_name  = 'alerts'
+    # append-only work log entries of the alerts, keyed by the _key of their alert in alert_key
+    work_log_coll_name = 'alert_work_log'
+    # default max_documents_per_batch_save in limits.conf [kvstore], batch_save requests are capped to it
+    max_batch_save = 1000
+    # default max_queries_per_batch in limits.conf [kvstore], batch_find requests are capped to it
+    max_batch_find = 1000
+    # number of dedupe keys per $in query
+    max_in = 500
+    # number of keys per $in query of delete_many, the query of a DELETE is sent in the URL
+    max_delete_in = 100
+    # update_many attempts again the alerts written concurrently by someone else at most this many times
+    max_update_retries = 3
 
     def __init__(self, session_key):
         self.session_key = session_key
-        self.alert_service = connect(token=session_key, app=self.app_name)
-        self.coll = self.alert_service.kvstore[self.coll_name]
+        self.alert_service = service_for(session_key, self.app_name)
+        # the collection entity is built from its name instead of fetching its configuration from splunkd,
+        # data requests only need the path and the kvstore namespace
+        kvstore = self.alert_service.kvstore
+        self.coll = KVStoreCollection(self.alert_service, kvstore.path + self.coll_name,
+            state=state_record({'title': self.coll_name}))
+        self.work_log = KVStoreCollection(self.alert_service, kvstore.path + self.work_log_coll_name,
+            state=state_record({'title': self.work_log_coll_name}))
         try:
-            siem_conf = self.alert_service.confs['super_simple_siem']
-            siem_constants = siem_conf['constants']
-            self.batch_size = int(siem_constants['batch_size'])
+            self.batch_size = int(siem_constants(self.alert_service)['batch_size'])
         except:
             self.batch_size = 10000
+        # write-behind buffer filled by insert() and written by flush()
+        self._pending = []
+        self._pending_outcomes = {}
+        self._pending_ids = []
+        self._pending_log = []
+        # combine index of the run: open or assigned alerts per (type, entity) and per (type, entity, values of
+        # the combine fields), with the time they are loaded from, for the combine policy they are indexed by
+        self._combine_policy = None
+        self._candidates = {}
+        self._combine_index = {}
+        self._since = {}
+        # dedupe index of the chunk: dedupe_key -> alert (or only its _key) with the keys already looked up
+        self._index = {}
+        self._looked_up = set()
 
     def purge(self):
         self.coll.data.delete()
+        self.work_log.data.delete()
 
     def fix_field_name(self, field_name):
-        import re
-        return re.sub('[.$]', '', field_name)
+        return fix_field_name(field_name)
 
 
-    # insert the record or combine with an existing record (if combine and combine_window allow it).
-    #   combining is based on type, entity, time and data subject to combine and combine_window constraints.
-    #   when combining, the main alert data is preserved, additional information is added to the work log.
+    # insert the record or combine with an existing record (if combine_policy allows it).
+    #   combining is based on type, entity, time and data subject to the combine fields and window of the policy.
+    #   when combining, the main alert data is preserved, additional information is added to the work log
+    #   without writing the alert again.
     # do no insert duplicate records (same type, entity, time and data).
+    # writes are buffered, call flush() once the chunk of records is processed.
     # if logger is provided, log duplicate records for troubleshooting.
     # if insert_stats is provided, tabulate counts of insert status
     def insert(self, record,
@@ -74,23 +346,21 @@ class AlertCollection:
             alert_type='type',
             severity=None,
             idfield=None,
-            combine=None,
-            combine_window=None,
+            combine_policy=None,
             preview=False,
             search_context=None,
             insert_stats=None):
-        import re
         logger = search_context.logger
         if insert_stats is None:
             insert_stats = InsertStats()
         if event_time in record and entity in record:
             sid = search_context.searchinfo.sid
 
-            alert_data = {self.fix_field_name(key): value for key, value in record.items() if key[0] != '_'}
-            alert_record = { 'data': alert_data }
+            alert_record = { 'data': self._alert_data(record) }
             alert_record['time'] = float(record[event_time])
             alert_record['entity'] = record[entity]
             alert_record['type'] = alert_type
+            alert_record['dedupe_key'] = dedupe_key(alert_record)
             alert_record['status'] = 'open'
             if severity:
                 alert_record['severity'] = record[severity]
@@ -99,74 +369,46 @@ class AlertCollection:
             alert_record['search_query'] = search_context.searchinfo.search
             alert_record['search_earliest'] = search_context.searchinfo.earliest_time
             alert_record['search_latest'] =search_context.searchinfo.latest_time
-            alert_record['work_log'] = [ {
-                'time': time.time(),
-                'action': 'create',
-                'notes': None,
-                'data': {},
-                'analyst': search_context.searchinfo.username
-            } ]
-            if combine and combine_window:
-                hours = re.match(r'(\d+)(hours?|h)', combine_window)
-                days = re.match(r'(\d+)(days?|d)', combine_window)
-                if hours:
-                    delta_seconds = int(hours.group(1)) * 3600
-                elif days:
-                    delta_seconds = int(days.group(1)) * 3600 * 24
-                else:
-                    logger.error("message=\"Cannot parse combine_window %s, default to 24h\"", combine_window)
-                    delta_seconds = 3600 * 24
-                cutoff = alert_record['time'] - delta_seconds
-                fields = combine.split(",")
-                def same_fields(old, new):
-                   return reduce(lambda a, b: a and b, map(lambda f: old['data'][f] == new['data'][f], fields))
-                candidates0 = [ a for a in self.find(alert_record['type'], alert_record['entity'], cutoff) ]
-                candidates1 = [ a for a in candidates0 if (a['status'] == 'open' or a['status'] == 'assigned') ]
-                candidates2 = [ a for a in candidates1 if same_fields(a, alert_record) ]
-                if candidates2:
-                    existing = candidates2[0]
+            username = search_context.searchinfo.username
+            if combine_policy:
+                self._use_combine_policy(combine_policy)
+                existing = self._combine_candidate(alert_record, alert_record['time'] - combine_policy.window)
+                if existing:
                     if existing['data'] == alert_record['data']:
-                        record[idfield] = existing['_key']
+                        self._set_id(record, idfield, existing)
                         insert_stats.duplicate += 1
-                        search_context.messages.append('alert not created, duplicate of %s' % existing['_key'])
+                        search_context.messages.append('alert not created, duplicate of %s' % existing.get('_key'))
                         logger.info('DUPLICATE alert_record: %s', alert_record)
                     else:
-                        alert_data['sid'] = sid
-                        existing['work_log'].insert(0, {
-                                'time': time.time(),
-                                'action': 'combine',
-                                'notes': None,
-                                'data': alert_data,
-                                'analyst': search_context.searchinfo.username
-                            })
+                        alert_record['data']['sid'] = sid
                         if not preview:
-                            self.coll.data.update(existing['_key'], json.dumps(existing))
-                        search_context.messages.append('alert %s would be updated' % existing['_key'])
-                        insert_stats.merged += 1
+                            self._log(existing, 'combine', data=alert_record['data'], analyst=username,
+                                outcome='merged')
+                        else:
+                            insert_stats.merged += 1
+                        search_context.messages.append('alert %s would be updated' % existing.get('_key'))
                 else:
                     if not preview:
-                        alert_id = self.coll.data.insert(json.dumps(alert_record))
-                        if idfield:
-                            record[idfield] = alert_id['_key']
-                    insert_stats.inserted += 1
+                        self._pend(alert_record, 'inserted', record, idfield)
+                        self._log(alert_record, 'create', analyst=username)
+                    else:
+                        insert_stats.inserted += 1
                     search_context.messages.append('alert would be inserted')
             else:
-                same_existing_alerts = [ a for a
-                    in self.find(alert_record['type'], alert_record['entity'], alert_record['time'])
-                    if a['data'] == alert_record['data']
-                ]
-                if not same_existing_alerts:
+                if alert_record['dedupe_key'] not in self._looked_up:
+                    self._load_dedupe_keys([alert_record['dedupe_key']])
+                same_existing_alert = self._index.get(alert_record['dedupe_key'])
+                if not same_existing_alert:
                     if not preview:
-                        alert_id = self.coll.data.insert(json.dumps(alert_record))
-                        if idfield:
-                            record[idfield] = alert_id['_key']
+                        self._pend(alert_record, 'inserted', record, idfield)
+                        self._log(alert_record, 'create', analyst=username)
+                    else:
+                        insert_stats.inserted += 1
                     search_context.messages.append('alert would be inserted')
-                    insert_stats.inserted += 1
                 else:
-                    if idfield:
-                        record[idfield] = same_existing_alerts[0]['_key']
+                    self._set_id(record, idfield, same_existing_alert)
                     search_context.messages.append(
-                        'alert not created, duplicate of %s' % same_existing_alerts[0]['_key'])
+                        'alert not created, duplicate of %s' % same_existing_alert.get('_key'))
                     insert_stats.duplicate += 1
                     logger.info('DUPLICATE alert_record: %s', alert_record)
         else:
@@ -175,6 +417,228 @@ class AlertCollection:
             logger.error('message="Missing fields in record: %s"', missing)
             insert_stats.errors += 1
 
+    # queue an alert document for the next flush, outcome is the InsertStats counter credited once it is written.
+    # a document is queued once even if several records are merged into it. indexed documents are found by the
+    # dedupe and combine lookups of the following records, the custom alert does neither and does not keep them.
+    def _pend(self, document, outcome, record=None, idfield=None, indexed=True):
+        if id(document) not in self._pending_outcomes:
+            self._pending.append(document)
+            self._pending_outcomes[id(document)] = []
+            if indexed and '_key' not in document:
+                self._add_candidate(document)
+                self._index.setdefault(document['dedupe_key'], document)
+        self._pending_outcomes[id(document)].append(outcome)
+        self._set_id(record, idfield, document)
+
+    # queue a work log entry of an alert for the next flush, it is written once the alert has a _key.
+    # outcome is the InsertStats counter credited once the entry is written.
+    def _log(self, document, action, notes=None, data=None, analyst=None, outcome=None):
+        self._pending_log.append((document, work_log_entry(action, notes, data, analyst), outcome))
+
+    # fill idfield with the key of the alert, deferred to flush() when the alert is not written yet.
+    def _set_id(self, record, idfield, document):
+        if idfield:
+            if '_key' in document:
+                record[idfield] = document['_key']
+            else:
+                self._pending_ids.append((record, idfield, document))
+
+    def _alert_data(self, record):
+        return alert_data(record)
+
+    # load, in as few batch_find requests as possible, the existing alerts the records could be duplicates of or
+    # combined with, and index them so insert() does not query the KV store per record. call once per chunk.
+    # without combine only the _key of the alerts with the same dedupe_key as the records are fetched.
+    # the combine index is kept for the following chunks of the run, only (type, entity) pairs it does not cover
+    # far enough back are loaded.
+    def prefetch(self, records, event_time='_time', entity='entity', alert_type='type',
+            combine_policy=None, logger=None):
+        self._use_combine_policy(combine_policy)
+        self._index = {}
+        self._looked_up = set()
+        if combine_policy:
+            delta_seconds = combine_policy.window
+            since = {}
+            for record in records:
+                if event_time in record and entity in record:
+                    try:
+                        pair = (alert_type, record[entity])
+                        time_gte = float(record[event_time]) - delta_seconds
+                    except ValueError:
+                        continue
+                    if pair not in since or time_gte < since[pair]:
+                        since[pair] = time_gte
+            self._load_candidates([(t, e, time_gte) for (t, e), time_gte in since.items()
+                if (t, e) not in self._since or time_gte < self._since[(t, e)]])
+        else:
+            keys = set()
+            for record in records:
+                if event_time in record and entity in record:
+                    try:
+                        keys.add(dedupe_key({
+                            'type': alert_type,
+                            'entity': record[entity],
+                            'time': record[event_time],
+                            'data': self._alert_data(record)}))
+                    except ValueError:
+                        continue
+            self._load_dedupe_keys(list(keys))
+
+    # look up which dedupe keys already exist in the collection, only their _key is returned by the KV store.
+    def _load_dedupe_keys(self, keys):
+        keys = [k for k in keys if k not in self._looked_up]
+        queries = [{'query': {'dedupe_key': {'$in': keys[i:i + self.max_in]}}, 'fields': '_key,dedupe_key'}
+            for i in range(0, len(keys), self.max_in)]
+        for start in range(0, len(queries), self.max_batch_find):
+            for found in self.coll.data.batch_find(*queries[start:start + self.max_batch_find]):
+                for a in found:
+                    self._index.setdefault(a['dedupe_key'], a)
+        self._looked_up.update(keys)
+
+    # query the open or assigned alerts of each (type, entity, time_gte) and merge them into the combine index.
+    # alerts already known (possibly modified and waiting for flush) are kept instead of the fetched copy.
+    def _load_candidates(self, wanted):
+        for start in range(0, len(wanted), self.max_batch_find):
+            batch = wanted[start:start + self.max_batch_find]
+            queries = []
+            for t, e, time_gte in batch:
+                query = self.find_query(t, e, time_gte)
+                query['status'] = {'$in': ['open', 'assigned']}
+                queries.append({'query': query, 'fields': 'work_log:0'})
+            results = self.coll.data.batch_find(*queries)
+            for (t, e, time_gte), found in zip(batch, results):
+                known = self._candidates.get((t, e), [])
+                known_keys = set(a['_key'] for a in known if '_key' in a)
+                self._candidates[(t, e)] = known
+                self._since[(t, e)] = time_gte
+                for a in found:
+                    if a['_key'] not in known_keys:
+                        self._add_candidate(a)
+
+    # the combine index is built for one policy, it starts over when the policy changes.
+    def _use_combine_policy(self, combine_policy):
+        if combine_policy != self._combine_policy:
+            self._combine_policy = combine_policy
+            self._candidates = {}
+            self._combine_index = {}
+            self._since = {}
+
+    # index an alert the records of the run can be combined with, alerts inserted by the run are added as they are
+    # queued and merged alerts are updated in place.
+    def _add_candidate(self, alert_record):
+        if self._combine_policy and alert_record['status'] in ('open', 'assigned'):
+            pair = (alert_record['type'], alert_record['entity'])
+            self._candidates.setdefault(pair, []).append(alert_record)
+            self._combine_index.setdefault(pair + self._combine_policy.key(alert_record['data']), []).append(
+                alert_record)
+
+    # first indexed alert with the type, entity and combine field values of alert_record and a time greater or
+    # equal to time_gte, the KV store is only queried when the index does not cover time_gte.
+    def _combine_candidate(self, alert_record, time_gte):
+        pair = (alert_record['type'], alert_record['entity'])
+        self._ensure_candidates(pair[0], pair[1], time_gte)
+        for a in self._combine_index.get(pair + self._combine_policy.key(alert_record['data']), []):
+            if a['time'] >= time_gte:
+                return a
+        return None
+
+    def _ensure_candidates(self, type, entity, time_gte):
+        pair = (type, entity)
+        if pair not in self._since or time_gte < self._since[pair]:
+            self._load_candidates([(type, entity, time_gte)])
+
+    # documents written with one batch_save: batch_size (the configured one by default) within the KV store limit
+    def save_batch_size(self, batch_size=None):
+        return max(1, min(batch_size or self.batch_size, self.max_batch_save))
+
+    # write the alerts buffered by insert with batch_save, then fill idfield of the records with the new keys and
+    # append the work log entries of the alerts that are written.
+    # insert_stats is credited only for documents the KV store accepted, rejected documents count as errors.
+    def flush(self, insert_stats=None, logger=None):
+        if insert_stats is None:
+            insert_stats = InsertStats()
+        pending, outcomes, pending_ids = self._pending, self._pending_outcomes, self._pending_ids
+        pending_log = self._pending_log
+        self._pending = []
+        self._pending_outcomes = {}
+        self._pending_ids = []
+        self._pending_log = []
+        saved = set()
+        size = self.save_batch_size()
+        for start in range(0, len(pending), size):
+            batch = pending[start:start + size]
+            for document, ok in zip(batch, self._save_batch(batch, logger)):
+                if ok:
+                    saved.add(id(document))
+                    for outcome in outcomes[id(document)]:
+                        setattr(insert_stats, outcome, getattr(insert_stats, outcome) + 1)
+                else:
+                    insert_stats.errors += len(outcomes[id(document)])
+                    self._forget(document)
+        for record, idfield, document in pending_ids:
+            if id(document) in saved:
+                record[idfield] = document['_key']
+        entries = []
+        entry_outcomes = []
+        for document, entry, outcome in pending_log:
+            if id(document) in outcomes and id(document) not in saved:
+                if outcome:
+                    insert_stats.errors += 1
+                continue
+            entry['alert_key'] = document['_key']
+            entries.append(entry)
+            entry_outcomes.append(outcome)
+        for start in range(0, len(entries), size):
+            batch = entries[start:start + size]
+            saved_entries = self._save_batch(batch, logger, self.work_log)
+            for outcome, ok in zip(entry_outcomes[start:start + size], saved_entries):
+                if outcome:
+                    if ok:
+                        setattr(insert_stats, outcome, getattr(insert_stats, outcome) + 1)
+                    else:
+                        insert_stats.errors += 1
+
+    # remove an alert the KV store rejected from the dedupe and combine indexes, the following records of the run
+    # must not be reported as its duplicates nor combined into it since it does not exist.
+    def _forget(self, document):
+        if self._index.get(document['dedupe_key']) is document:
+            del self._index[document['dedupe_key']]
+        if self._combine_policy:
+            pair = (document['type'], document['entity'])
+            for index, key in ((self._candidates, pair),
+                    (self._combine_index, pair + self._combine_policy.key(document['data']))):
+                if key in index:
+                    index[key] = [a for a in index[key] if a is not document]
+
+    # save batch to coll (the alerts by default) with one batch_save and return whether each document was saved.
+    # when the KV store rejects the batch, each document is saved on its own so that only the offending ones are
+    # lost and reported. new documents get their _key before saving, which makes saving again a document of a
+    # failed batch harmless.
+    def _save_batch(self, batch, logger=None, coll=None):
+        coll = coll or self.coll
+        for document in batch:
+            if '_key' not in document:
+                document['_key'] = uuid.uuid4().hex
+        try:
+            coll.data.batch_save(*batch)
+            return [True] * len(batch)
+        except HTTPError as e:
+            if logger:
+                logger.warning('message="Cannot save %d documents at once, saving them one by one: %s",collection=%s',
+                    len(batch), e, coll.name)
+        saved = []
+        for document in batch:
+            try:
+                coll.data.batch_save(document)
+                saved.append(True)
+            except HTTPError as e:
+                saved.append(False)
+                if logger:
+                    logger.error('message="Document rejected by the KV store: %s",collection=%s,type="%s",'
+                        'entity="%s",time=%s,alert_key=%s', e, coll.name, document.get('type'),
+                        document.get('entity'), document.get('time'), document.get('alert_key'))
+        return saved
+
     # insert the record when it originates from the custom alert (not from makealerts)
     def insert_custom_alert(self, record,
             event_time='_time',
@@ -189,11 +653,11 @@ class AlertCollection:
             server_uri=None,
             search_uri=None,
             results_link=None,
-            logger=None
+            logger=None,
+            insert_stats=None
             ):
 
-        alert_data = {self.fix_field_name(key): value for key, value in record.items()}
-        alert_record = { 'data': alert_data }
+        alert_record = { 'data': alert_data(record, skip_internal=False) }
 
         if event_time in record:
             alert_record['time'] = float(record[event_time])
@@ -206,6 +670,7 @@ class AlertCollection:
             alert_record['entity'] = ''
 
         alert_record['type'] = alert_type
+        alert_record['dedupe_key'] = dedupe_key(alert_record)
         alert_record['status'] = 'open'
         if severity:
             alert_record['severity'] = severity
@@ -216,137 +681,430 @@ class AlertCollection:
         alert_record['search_name'] = search_name
         alert_record['search_uri'] = search_uri
         alert_record['results_link'] = results_link
-        alert_record['work_log'] = [ {
-            'time': time.time(),
-            'action': 'create',
-            'notes': None,
-            'data': {},
-            'analyst': owner
-        } ]
         missing = set(['time', 'entity', 'type']) - set(alert_record.keys())
         if missing:
             if logger:
                 logger.error('alert not inserted, missing fields %s', missing)
+            if insert_stats:
+                insert_stats.errors += 1
         else:
-            alert_id = self.coll.data.insert(json.dumps(alert_record))
-            if alert_id:
-                if logger:
-                    logger.info('alert inserted %s', alert_id)
+            # written with batch_save once a batch is buffered, call flush() after the last record
+            self._pend(alert_record, 'inserted', indexed=False)
+            self._log(alert_record, 'create', analyst=owner)
+            if len(self._pending) >= self.save_batch_size():
+                self.flush(insert_stats=insert_stats, logger=logger)
 
-    # CSV file with a single json column with the json as exported by | listalerts json=json
-    def csv_import(self, file_of_json_inside_csv):
+    # CSV file with a single json column with the json as exported by | listalerts json=json, imported like
+    # import_file (offset counts the alerts, not the header)
+    def csv_import(self, file_of_json_inside_csv, batch_size=None, offset=0, logger=None):
         import csv
         with open(file_of_json_inside_csv, 'r') as csvfile:
             rows = csv.reader(csvfile)
-            for row in rows:
-                if row[0] != 'json':
-                    self.coll.data.insert(row[0])
+            return self._import_alerts((row[0] for row in rows if row and row[0] != 'json'),
+                batch_size=batch_size, offset=offset, logger=logger)
 
+    # write the alerts, with their work log joined, to the gzip JSON-lines file path one page at a time.
+    # returns the number of alerts written.
+    def export(self, path, logger=None):
+        count = 0
+        with gzip.open(path, 'wb') as f:
+            for alert_record in self.with_work_log(self.query_wrapper({})):
+                f.write((json.dumps(alert_record) + '\n').encode('utf-8'))
+                count += 1
+                if logger and count % self.batch_size == 0:
+                    logger.info('message="Alerts exported",count=%d', count)
+        return count
+
+    # import the JSON-lines file path (gzip when its name ends with .gz) written by export or prune, skipping the
+    # first offset alerts. the alerts keep their _key so importing one again overwrites it: after an interruption,
+    # run again with the offset of the last progress message. returns the offset reached.
+    def import_file(self, path, batch_size=None, offset=0, logger=None):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            return self._import_alerts((line.decode('utf-8') for line in f if line.strip()),
+                batch_size=batch_size, offset=offset, logger=logger)
+
+    # save the alerts of the json strings lines after the first offset ones, batch_size (at most max_batch_save)
+    # alerts with one batch_save, their work log entries with another, a batch is parsed only once it is saved.
+    def _import_alerts(self, lines, batch_size=None, offset=0, logger=None):
+        size = self.save_batch_size(batch_size)
+        lines = itertools.islice(lines, offset, None)
+        while True:
+            batch = [json.loads(line) for line in itertools.islice(lines, size)]
+            if not batch:
+                return offset
+            entries = []
+            for alert_record in batch:
+                work_log = alert_record.pop('work_log', None) or []
+                entries.extend(entry for entry in work_log if 'alert_key' in entry)
+                legacy = [entry for entry in work_log if 'alert_key' not in entry]
+                if legacy:
+                    alert_record['work_log'] = legacy
+                    if '_key' in alert_record:
+                        entries.extend(self._take_work_log(alert_record))
+            self._save_all(self.work_log, entries)
+            self.coll.data.batch_save(*batch)
+            offset += len(batch)
+            if logger:
+                logger.info('message="Alerts imported",offset=%d', offset)
+
+    # alert_record may come from listalerts json= with its work log joined, the alert is written without it and
+    # the entries that were still stored inside the alert are moved to the work log collection.
     def replace(self, alert_record, notes=None, logger=None, sid=None, username=None):
         key = alert_record.get("_key")
         if key:
+            # type, entity, time or data may have been edited
+            if all(f in alert_record for f in ('type', 'entity', 'time', 'data')):
+                alert_record['dedupe_key'] = dedupe_key(alert_record)
+            new_revision(alert_record)
+            entries = self._take_work_log(alert_record)
             if notes:
-                alert_record['work_log'].insert(0, {
-                        'time': time.time(),
-                        'action': 'update',
-                        'notes': notes,
-                        'data': {'sid': sid},
-                        'analyst': username
-                    })
+                entries.append(work_log_entry('update', notes, {'sid': sid}, username, key))
             self.coll.data.update(key, json.dumps(alert_record))
+            if entries:
+                self.work_log.data.batch_save(*entries)
         else:
             logger.error('message="Cannot find alert: %s"', str(key))
 
     def update(self, key, action, status, notes=None, logger=None, sid=None, username=None):
         if key:
-            alert_record = self.coll.data.query_by_id(key)
-            alert_record['status'] = status
-            alert_record['work_log'].insert(0, {
-                    'time': time.time(),
-                    'action': action,
-                    'notes': notes,
-                    'data': {'sid': sid},
-                    'analyst': username
-                })
-            self.coll.data.update(key, json.dumps(alert_record))
+            self.update_many([(key, action, status, notes)], logger=logger, sid=sid, username=username)
         else:
             logger.error('sid=%s,message="Cannot find alert: %s"', sid, str(key))
 
+    # set the status of alerts and append a work log entry for each (key, action, status, notes) of updates, with
+    # a few requests for all of them. the KV store writes whole documents and has no conditional write, so each
+    # alert gets a version and a revision token: alerts whose version changed between the read and the write are
+    # read again instead of being overwritten, and alerts whose revision is not ours once written (a concurrent
+    # write won) are updated again, up to max_update_retries times. returns the number of alerts updated.
+    def update_many(self, updates, logger=None, sid=None, username=None):
+        status = OrderedDict((key, s) for key, action, s, notes in updates)
+        remaining = list(status)
+        missing = set()
+        for attempt in range(self.max_update_retries + 1):
+            if not remaining:
+                break
+            alerts = self._find_by_keys(remaining)
+            missing.update(k for k in remaining if k not in alerts)
+            read_versions = {}
+            revisions = {}
+            for key, alert_record in alerts.items():
+                read_versions[key] = alert_record.get('version', 0)
+                alert_record['status'] = status[key]
+                revisions[key] = new_revision(alert_record)
+            current = self._find_by_keys(list(alerts), fields='_key,version')
+            writable = [a for k, a in alerts.items()
+                if k in current and current[k].get('version', 0) == read_versions[k]]
+            # entries still stored inside the alerts about to be written are saved before the alerts without them,
+            # the alerts read again keep theirs until they are written
+            moved = []
+            for alert_record in writable:
+                moved.extend(self._take_work_log(alert_record))
+            self._save_all(self.work_log, moved)
+            self._save_all(self.coll, writable)
+            written = self._find_by_keys([a['_key'] for a in writable], fields='_key,revision')
+            remaining = [k for k in alerts if k not in written or written[k].get('revision') != revisions[k]]
+            if remaining and logger:
+                logger.warning('sid=%s,message="Alerts changed concurrently, updating them again",attempt=%d,keys="%s"',
+                    sid, attempt + 1, ','.join(remaining))
+        if remaining and logger:
+            logger.error('sid=%s,message="Alerts not updated after %d attempts",keys="%s"',
+                sid, self.max_update_retries + 1, ','.join(remaining))
+        if missing and logger:
+            logger.error('sid=%s,message="Cannot find alerts",keys="%s"', sid, ','.join(sorted(missing)))
+        # no entry for the alerts that were not updated, the work log only records changes that happened
+        failed = missing.union(remaining)
+        self._save_all(self.work_log, [work_log_entry(action, notes, {'sid': sid}, username, key)
+            for key, action, s, notes in updates if key not in failed])
+        return len(status) - len(missing) - len(remaining)
+
+    # alerts by _key, fields is an optional KV projection
+    def _find_by_keys(self, keys, fields=None):
+        queries = []
+        for i in range(0, len(keys), self.max_in):
+            query = {'query': {'_key': {'$in': keys[i:i + self.max_in]}}}
+            if fields:
+                query['fields'] = fields
+            queries.append(query)
+        found = {}
+        for start in range(0, len(queries), self.max_batch_find):
+            for alerts in self.coll.data.batch_find(*queries[start:start + self.max_batch_find]):
+                for a in alerts:
+                    found[a['_key']] = a
+        return found
+
+    def _save_all(self, coll, documents):
+        size = self.save_batch_size()
+        for start in range(0, len(documents), size):
+            coll.data.batch_save(*documents[start:start + size])
+
+    # remove the work_log of an alert and return the entries that were stored inside the alert (the ones that do
+    # not come from the work log collection) as work log collection documents. their _key is derived from the
+    # alert key and their position so that moving them again overwrites them.
+    def _take_work_log(self, alert_record):
+        work_log = alert_record.pop('work_log', None) or []
+        key = alert_record['_key']
+        return [dict(entry, _key='%s-%d' % (key, len(work_log) - i), alert_key=key)
+            for i, entry in enumerate(work_log) if 'alert_key' not in entry]
+
+    # work log entries of the alerts, most recent first, by alert key.
+    def work_logs(self, keys):
+        entries = dict((key, []) for key in keys)
+        queries = [{'query': {'alert_key': {'$in': keys[i:i + self.max_in]}}, 'sort': 'time:-1'}
+            for i in range(0, len(keys), self.max_in)]
+        for start in range(0, len(queries), self.max_batch_find):
+            for found in self.work_log.data.batch_find(*queries[start:start + self.max_batch_find]):
+                for entry in found:
+                    entries[entry['alert_key']].append(entry)
+        return entries
+
+    # generator of the records with their work_log joined from the work log collection, one batch_find for each
+    # max_in records. entries still stored inside an alert that is not migrated yet are kept.
+    def with_work_log(self, records):
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, self.max_in))
+            if not batch:
+                return
+            entries = self.work_logs([r['_key'] for r in batch])
+            for record in batch:
+                work_log = entries[record['_key']] + (record.get('work_log') or [])
+                work_log.sort(key=lambda entry: entry.get('time') or 0, reverse=True)
+                record['work_log'] = work_log
+                yield record
+
     def delete(self, key, logger=None):
         if key:
-            self.coll.data.delete_by_id(key)
-        else:
-            logger.error('sid=%s,message="Cannot find alert: %s"', sid, str(key))
+            self.delete_many([key], logger=logger)
+        elif logger:
+            logger.error('message="Cannot find alert: %s"', str(key))
+
+    # delete the alerts of keys and their work log with one query based DELETE per max_delete_in keys.
+    # delete_stats counts the keys of the requests that succeeded and of the ones that failed.
+    def delete_many(self, keys, delete_stats=None, logger=None):
+        if delete_stats is None:
+            delete_stats = DeleteStats()
+        keys = list(OrderedDict.fromkeys(k for k in keys if k))
+        for start in range(0, len(keys), self.max_delete_in):
+            batch = keys[start:start + self.max_delete_in]
+            try:
+                self.coll.data.delete(query=json.dumps({'_key': {'$in': batch}}))
+                self.work_log.data.delete(query=json.dumps({'alert_key': {'$in': batch}}))
+                delete_stats.deleted += len(batch)
+            except HTTPError as e:
+                delete_stats.errors += len(batch)
+                if logger:
+                    logger.error('message="Cannot delete alerts: %s",keys="%s"', e, ','.join(batch))
+        return delete_stats
 
     def find(self, type, entity, time_gte):
         """Find records for the type, entity and time (int)."""
-        q = {
+        encoded = json.dumps(self.find_query(type, entity, time_gte))
+        return self.coll.data.query(query=encoded)
+
+    def find_query(self, type, entity, time_gte):
+        return {
             'type': type,
             'entity': entity,
             'time': { '$gte': time_gte}
         }
-        encoded = json.dumps(q)
-        return self.coll.data.query(query=encoded)
 
-    def query_wrapper(self, query_dict):
-        query_json = json.dumps(query_dict)
-        results = []
-        skip = 0
+    # generator of the alerts matching query_dict, most recent first, sorted by the KV store and fetched one page
+    # of batch_size alerts at a time. fields is an optional KV projection, for instance 'work_log:0,data:0'.
+    # limit caps the number of alerts fetched, the next page is only requested once the previous one is consumed.
+    def query_wrapper(self, query_dict, fields=None, limit=None):
+        return self._query_pages(self.coll.data, query_dict, fields=fields, limit=limit)
+
+    # pages are read with a cursor on the (time, _key) of the last alert returned rather than with skip, so each
+    # page costs the same and alerts inserted or deleted during the scan do not shift the following pages.
+    def _query_pages(self, data, query_dict, fields=None, limit=None):
+        projection = {'fields': fields} if fields else {}
+        if fields and ':0' not in fields:
+            # an include projection must keep the cursor fields
+            projection['fields'] = fields + ',time'
+        count = 0
+        cursor_query = query_dict
         while True:
-            batch = self.coll.data.query(query=query_json, limit=self.batch_size, skip=skip, sort='_key')
-            results.extend(batch)
-            skip += len(batch)
-            if len(batch) < self.batch_size:
+            page_size = self.batch_size if not limit else min(self.batch_size, limit - count)
+            if page_size <= 0:
+                break
+            batch = data.query(query=json.dumps(cursor_query), limit=page_size, sort='time:-1,_key:1', **projection)
+            for record in batch:
+                yield record
+            count += len(batch)
+            if len(batch) < page_size:
                 break
-        return sorted(results, key=lambda r: -r['time'])
+            last = batch[-1]
+            after = {'$or': [
+                {'time': {'$lt': last['time']}},
+                {'time': last['time'], '_key': {'$gt': last['_key']}}
+            ]}
+            cursor_query = {'$and': [query_dict, after]} if query_dict else after
 
+    # same result as query_wrapper, but the time span of the matching alerts is cut into slices that are fetched
+    # concurrently by a pool of workers threads, each request on its own pooled connection. slices are yielded newest
+    # first as they complete, at most workers + 1 slices are held in memory.
+    def parallel_query(self, query_dict, fields=None, workers=4):
+        from multiprocessing.pool import ThreadPool
+        from collections import deque
+
+        query_json = json.dumps(query_dict)
+        newest = self.coll.data.query(query=query_json, limit=1, sort='time:-1', fields='time')
+        oldest = self.coll.data.query(query=query_json, limit=1, sort='time:1', fields='time')
+        if not newest or not oldest:
+            return
+        # edges between slices, newest first. the first and last slices are open ended so that alerts created
+        # while scanning beyond the bounds are still listed.
+        slice_count = workers * 4
+        step = (newest[0]['time'] - oldest[0]['time']) / slice_count
+        edges = [newest[0]['time'] - step * i for i in range(1, slice_count)] if step > 0 else []
+        slices = []
+        upper = None
+        for lower in edges + [None]:
+            time_range = {}
+            if lower is not None:
+                time_range['$gte'] = lower
+            if upper is not None:
+                time_range['$lt'] = upper
+            slices.append({'$and': [query_dict, {'time': time_range}]} if time_range else query_dict)
+            upper = lower
+
+        def fetch(slice_query):
+            return list(self._query_pages(self.coll.data, slice_query, fields=fields))
+
+        pool = ThreadPool(workers)
+        try:
+            remaining = iter(slices)
+            running = deque(pool.apply_async(fetch, (q,)) for q in itertools.islice(remaining, workers))
+            while running:
+                records = running.popleft().get()
+                for slice_query in itertools.islice(remaining, 1):
+                    running.append(pool.apply_async(fetch, (slice_query,)))
+                for record in records:
+                    yield record
+        finally:
+            pool.terminate()
+
+    # workers > 1 fetches with parallel_query, unless a limit makes a sequential scan cheaper.
     def list(self, status = [], type=[], severity=[], analyst=[], entity=[],
             earliest_time=None, latest_time=None,
+            fields=None, limit=None, workers=None,
             logger=None):
-        if status or type or analyst or entity or severity:
-            if status:
-                qs = { '$or': [{ 'status': s } for s in status] }
-            else:
-                qs = {}
-            if type:
-                qt = { '$or': [{ 'type': s } for s in type] }
-            else:
-                qt = {}
-            if analyst:
-                qa = { '$or': [{ 'analyst': s } for s in analyst] }
-            else:
-                qa = {}
-            if entity:
-                qe = { '$or': [{ 'entity': s } for s in entity] }
-            else:
-                qe = {}
-            if severity:
-                qss = { '$or': [{ 'severity': s } for s in severity] }
-            else:
-                qss = {}
-            clauses = []
-            if qs: clauses.append(qs)
-            if qt: clauses.append(qt)
-            if qa: clauses.append(qa)
-            if qe: clauses.append(qe)
-            if qss: clauses.append(qss)
-            if earliest_time: clauses.append({'time': {'$gte': earliest_time}})
-            if latest_time: clauses.append({'time': {'$lt': latest_time}})
-            res = self.query_wrapper({ '$and': clauses })
-        else:
-            if earliest_time or latest_time:
-                clauses = []
-                if earliest_time: clauses.append({'time': {'$gte': earliest_time}})
-                if latest_time: clauses.append({'time': {'$lt': latest_time}})
-                res = self.query_wrapper({ '$and': clauses })
-            else:
-                res = self.query_wrapper({})
-        return res
+        query_dict = self.list_query(status=status, type=type, severity=severity, analyst=analyst,
+            entity=entity, earliest_time=earliest_time, latest_time=latest_time)
+        if workers and workers > 1 and not limit:
+            return self.parallel_query(query_dict, fields=fields, workers=workers)
+        return self.query_wrapper(query_dict, fields=fields, limit=limit)
+
+    def list_query(self, status = [], type=[], severity=[], analyst=[], entity=[],
+            earliest_time=None, latest_time=None):
+        return plan_list_query(
+            {'status': status, 'type': type, 'severity': severity, 'analyst': analyst, 'entity': entity},
+            earliest_time=earliest_time, latest_time=latest_time)
 
+    # accelerated fields of the collection (name -> ordered list of fields) as configured in collections.conf.
+    def indexes(self):
+        prefix = 'accelerated_fields.'
+        content = self.alert_service.kvstore[self.coll_name].content
+        return OrderedDict(
+            (name[len(prefix):], list(json.loads(value, object_pairs_hook=OrderedDict).keys()))
+            for name, value in sorted(content.items()) if name.startswith(prefix))
+
+    # report the accelerated field each query shape of list() and find() would use.
+    def explain(self):
+        indexes = self.indexes()
+        shapes = [('find type,entity,time', self.find_query('t', 'e', 0))]
+        dimensions = ['status', 'type', 'severity', 'analyst', 'entity']
+        for n in range(len(dimensions) + 1):
+            for filters in itertools.combinations(dimensions, n):
+                for times in [(), ('earliest_time',), ('earliest_time', 'latest_time')]:
+                    kwargs = dict((f, ['a', 'b']) for f in filters)
+                    kwargs.update((t, 1) for t in times)
+                    shapes.append(('list ' + ','.join(filters + times), self.list_query(**kwargs)))
+        report = []
+        for shape, query in shapes:
+            name, used = index_for_query(query, indexes)
+            report.append('shape="%s" index=%s fields="%s"' % (shape, name or 'NONE', ','.join(used)))
+        return report
+
+    # one time update of the alerts created before dedupe_key was stored, returns the number of alerts updated.
+    # the alerts without dedupe_key are read with the (time, _key) cursor, alerts inserted meanwhile do not shift
+    # the pages. an alert without time has no dedupe key and could not be paged past.
+    def backfill_dedupe_keys(self):
+        updated = 0
+        size = self.save_batch_size()
+        query_dict = {'dedupe_key': {'$exists': False}, 'time': {'$exists': True}}
+        alerts = (a for a in self._query_pages(self.coll.data, query_dict)
+            if all(f in a for f in ('type', 'entity', 'data')))
+        while True:
+            batch = list(itertools.islice(alerts, size))
+            if not batch:
+                return updated
+            for a in batch:
+                a['dedupe_key'] = dedupe_key(a)
+            self.coll.data.batch_save(*batch)
+            updated += len(batch)
+
+    # delete the alerts with one of the statuses (all of them when empty) older than days days, with their work log.
+    # with archive, the alerts and their work log are first appended to the gzip JSON-lines file archive, one page
+    # at a time, and only the archived alerts are deleted by key. without archive only the keys of the alerts are
+    # read, each page of them is deleted by key as it comes. returns the DeleteStats.
+    def prune(self, days, status=['closed'], archive=None, logger=None):
+        delete_stats = DeleteStats()
+        query_dict = self.list_query(status=status, latest_time=time.time() - days * 24 * 3600)
+        if archive:
+            alerts = self.with_work_log(self.query_wrapper(query_dict))
+            with gzip.open(archive, 'ab') as f:
+                while True:
+                    batch = list(itertools.islice(alerts, max(1, self.batch_size)))
+                    if not batch:
+                        break
+                    for alert_record in batch:
+                        f.write((json.dumps(alert_record) + '\n').encode('utf-8'))
+                    f.flush()
+                    self.delete_many([a['_key'] for a in batch], delete_stats=delete_stats, logger=logger)
+                    if logger:
+                        logger.info('message="Alerts archived to %s",%s', archive, delete_stats)
+            return delete_stats
+        # delete the listed keys rather than the query, the work log is cleaned for exactly the alerts deleted
+        keys = (a['_key'] for a in self.query_wrapper(query_dict, fields='_key'))
+        while True:
+            batch = list(itertools.islice(keys, max(1, self.batch_size)))
+            if not batch:
+                return delete_stats
+            self.delete_many(batch, delete_stats=delete_stats, logger=logger)
+            if logger:
+                logger.info('message="Alerts pruned",%s', delete_stats)
+
+    # one time move of the work_log stored inside the alerts to the work log collection, returns the number of
+    # alerts migrated. the entries are written before the alert, an interrupted migration can be run again.
+    def migrate_work_log(self, logger=None):
+        migrated = 0
+        size = self.save_batch_size()
+        alerts = (a for a in self._query_pages(self.coll.data, {}) if 'work_log' in a)
+        while True:
+            batch = list(itertools.islice(alerts, size))
+            if not batch:
+                return migrated
+            entries = []
+            for alert_record in batch:
+                entries.extend(self._take_work_log(alert_record))
+            for start in range(0, len(entries), size):
+                self.work_log.data.batch_save(*entries[start:start + size])
+            self.coll.data.batch_save(*batch)
+            migrated += len(batch)
+            if logger:
+                logger.info('message="Work log migrated",alerts=%d', migrated)
+
+    # print the alerts as JSON lines, one page at a time
     def dump(self):
-        print("Collection data: %s" % json.dumps(self.coll.data.query(), indent=1))
+        for alert_record in self.query_wrapper({}):
+            print(json.dumps(alert_record))
 
 def main():
+    if 'benchmark' in sys.argv:
+        benchmark_alert_data()
+        return
     opts = parse(sys.argv[1:], {}, ".splunkrc")
     #print(opts)
     service = connect(**opts.kwargs)
@@ -355,9 +1113,30 @@ def main():
         alerts.purge()
     elif 'dump' in sys.argv:
         alerts.dump()
-    elif 'import'in sys.argv and len(sys.argv) == 3:
-        filename = sys.argv[2]
-        alerts.csv_import(filename)
+    elif 'export' in sys.argv and len(sys.argv) > sys.argv.index('export') + 1:
+        # export <file>: gzip JSON-lines of the alerts with their work log
+        logging.basicConfig(level=logging.INFO)
+        path = sys.argv[sys.argv.index('export') + 1]
+        print("Alerts exported: %d" % alerts.export(path, logger=logging.getLogger('alert_collection')))
+    elif 'import' in sys.argv and len(sys.argv) > sys.argv.index('import') + 1:
+        # import <file> [offset [batch size]]: .csv files as exported by listalerts json=json, JSON-lines otherwise
+        logging.basicConfig(level=logging.INFO)
+        args = sys.argv[sys.argv.index('import') + 1:]
+        offset = int(args[1]) if len(args) > 1 else 0
+        batch_size = int(args[2]) if len(args) > 2 else None
+        load = alerts.csv_import if args[0].endswith('.csv') else alerts.import_file
+        print("Alerts imported up to offset: %d" % load(args[0], batch_size=batch_size, offset=offset,
+            logger=logging.getLogger('alert_collection')))
+    elif 'backfill' in sys.argv:
+        print("Alerts updated with dedupe_key: %d" % alerts.backfill_dedupe_keys())
+    elif 'explain' in sys.argv:
+        print("\n".join(alerts.explain()))
+    elif 'prune' in sys.argv and len(sys.argv) > sys.argv.index('prune') + 1:
+        # prune <days> [archive file]: closed alerts older than days days
+        args = sys.argv[sys.argv.index('prune') + 1:]
+        print("Alerts pruned: %s" % alerts.prune(float(args[0]), archive=args[1] if len(args) > 1 else None))
+    elif 'migrate' in sys.argv:
+        print("Alerts with their work log moved to %s: %d" % (alerts.work_log_coll_name, alerts.migrate_work_log()))
 
 if __name__ == "__main__":
     main()
@@ -372,3 +1151,11 @@ class InsertStats:
     def __str__(self):
         return 'inserted=%d,duplicate=%d,merged=%d,errors=%d,whitelisted=%d' % (
         self.inserted, self.duplicate, self.merged, self.errors, self.whitelisted)
+
+class DeleteStats:
+    def __init__(self):
+        self.deleted = 0
+        self.errors = 0
+        self.skipped = 0
+    def __str__(self):
+        return 'deleted=%d,errors=%d,skipped=%d' % (self.deleted, self.errors, self.skipped)
@@ -20,10 +20,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from splunklib.searchcommands import dispatch, StreamingCommand, Configuration, Option, validators
 import sys, json
 from splunklib.client import connect
-from alert_collection import AlertCollection
+from alert_collection import AlertCollection, DeleteStats
+from multivalue import MultivalueDecoder
 
 @Configuration()
-class DeleteAlertsCommand(StreamingCommand):
+class DeleteAlertsCommand(MultivalueDecoder, StreamingCommand):
 
     key = Option(
         doc='''
@@ -33,17 +34,36 @@ class DeleteAlertsCommand(StreamingCommand):
 
     alerts = None
 
+    def __init__(self):
+        super(DeleteAlertsCommand, self).__init__()
+        self.delete_stats = DeleteStats()
+
     def stream(self, records):
         self.logger.info('DeleteAlertsCommand: %s', self)  # logs command line
         if not self.alerts:
             self.alerts = AlertCollection(self._metadata.searchinfo.session_key)
 
+        # the alerts of the chunk are deleted together once the chunk is read
+        records = list(records)
+        keys = []
         for record in records:
-            if self.key in record:
-                self.alerts.delete(record[self.key], logger=self.logger)
+            if record.get(self.key):
+                keys.append(record[self.key])
             else:
-                self.logger.error('DeleteAlertsCommand: no key field %s', str(self.json))  # logs command line
+                self.delete_stats.skipped += 1
+                self.logger.error('DeleteAlertsCommand: no key field %s', str(self.key))
+        self.alerts.delete_many(keys, delete_stats=self.delete_stats, logger=self.logger)
+        self.logger.info('DeleteAlertsCommand: progress %s', self.delete_stats)
+        for record in records:
             yield record
 
+    def finish(self):
+        self.logger.info('s3tag=stats,%s', self.delete_stats)
+        if self.delete_stats.errors > 0:
+            self.write_error(
+                "There were {0} alert(s) that could not be deleted, check logs with this search 'index=_internal DeleteAlertsCommand source=*super_simple_siem.log* ERROR'",
+                self.delete_stats.errors)
+        super(DeleteAlertsCommand, self).finish()
+
 dispatch(DeleteAlertsCommand, sys.argv, sys.stdin, sys.stdout, __name__)
 
@@ -18,11 +18,39 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from splunklib.searchcommands import dispatch, StreamingCommand, Configuration, Option, validators
-import sys, json, collections
+import sys, json
 from splunklib.client import connect
+from multivalue import MultivalueDecoder
+
+# values of an a_ field are json encoded array elements (a single value when the field is not multivalue). scalar
+# elements are parsed by one json.loads of the whole array, an element with a , [ or { could merge with its
+# neighbours once joined so those arrays are parsed one element at a time
+def json_array(value):
+    values = value if isinstance(value, list) else [value] if value else []
+    if not any(',' in v or '[' in v or '{' in v for v in values):
+        try:
+            array = json.loads('[' + ','.join(values) + ']')
+            if len(array) == len(values):
+                return array
+        except ValueError:
+            pass
+    return [json.loads(v) for v in values]
+
+def identity(value):
+    return value
+
+# converter of each type letter of the typed field names, int also covers the l (long) type
+CONVERTERS = {
+    's': identity,
+    'l': int,
+    'i': int,
+    'f': float,
+    'j': json.loads,
+    'a': json_array
+}
 
 @Configuration()
-class FieldsToJsonCommand(StreamingCommand):
+class FieldsToJsonCommand(MultivalueDecoder, StreamingCommand):
     json = Option(
         doc='''
         **Syntax:** **json=***<field>*
@@ -34,28 +62,26 @@ class FieldsToJsonCommand(StreamingCommand):
         **Description:** Any field that is prefixed with this string is serialized.''',
         require=True)
 
+    # field names the plan is made for and the plan: (field, json key, converter) of the typed fields with prefix
+    _plan_fields = None
+    _plan = None
+
+    def plan(self, record):
+        fields = tuple(record)
+        if fields != self._plan_fields:
+            start = 2 + len(self.prefix)
+            self._plan = [(key, key[start:], CONVERTERS[key[0]]) for key in fields
+                if key[2:].startswith(self.prefix) and key[0] in CONVERTERS]
+            self._plan_fields = fields
+        return self._plan
+
     def stream(self, records):
         self.logger.info('FieldsToJsonCommand: %s', self)  # logs command line
         for record in records:
             json_obj = {}
-            for key, value in record.iteritems():
-                if key[2:].startswith(self.prefix):
-                    tp = key[0]
-                    actual_key = key[(2+len(self.prefix)):]
-                    if tp == 's':
-                        json_obj[actual_key] = value
-                    elif tp == 'l':
-                        json_obj[actual_key] = long(value)
-                    elif tp == 'i':
-                        json_obj[actual_key] = int(value)
-                    elif tp == 'f':
-                        json_obj[actual_key] = float(value)
-                    elif tp == 'j':
-                        json_obj[actual_key] = json.loads(value)
-                    elif tp == 'a':
-                        json_obj[actual_key] = [ json.loads(v) for v in value ]
+            for key, actual_key, convert in self.plan(record):
+                json_obj[actual_key] = convert(record[key])
             record[self.json] = json.dumps(json_obj)
             yield record
 
 dispatch(FieldsToJsonCommand, sys.argv, sys.stdin, sys.stdout, __name__)
-
@@ -18,11 +18,45 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from splunklib.searchcommands import dispatch, StreamingCommand, Configuration, Option, validators
-import sys, json, collections
+from splunklib import six
+import sys, json
 from splunklib.client import connect
+from multivalue import MultivalueDecoder
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+# orjson decodes faster when it is installed, the standard json module otherwise
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+# the memo of the output field names is emptied when it reaches this many names
+FIELD_NAMES_MEMO_SIZE = 10000
+
+# type letter of the typeprefix option by the type of a decoded json value, other types go through type_letter
+TYPE_LETTERS = dict([(t, 's') for t in six.string_types + (six.text_type,)] +
+    [(dict, 'j'), (list, 'a'), (float, 'f'), (bool, 'i'), (int, 'i'), (type(None), 'x')] +
+    [(t, 'l') for t in six.integer_types if t is not int])
+
+def type_letter(value):
+    if isinstance(value, six.string_types):
+        return 's'
+    elif isinstance(value, Mapping):
+        return 'j'
+    elif isinstance(value, Sequence):
+        return 'a'
+    elif isinstance(value, float):
+        return 'f'
+    elif isinstance(value, int):
+        return 'i'
+    elif isinstance(value, six.integer_types):
+        return 'l'
+    return 'x'
 
 @Configuration()
-class JsonToFieldsCommand(StreamingCommand):
+class JsonToFieldsCommand(MultivalueDecoder, StreamingCommand):
     json = Option(
         doc='''
         **Syntax:** **json=***<field>*
@@ -39,52 +73,40 @@ class JsonToFieldsCommand(StreamingCommand):
         **Description:** If true, prefix fields with a letter indicating the type (long, int, float, string, json, array)''',
         require=False, default=False, validate=validators.Boolean())
 
+    def __init__(self):
+        super(JsonToFieldsCommand, self).__init__()
+        # output field name by (key, type letter), emptied when the json objects have too many distinct keys
+        self.field_names = {}
+
+    def field_name(self, key, letter):
+        name = self.field_names.get((key, letter))
+        if name is None:
+            if len(self.field_names) >= FIELD_NAMES_MEMO_SIZE:
+                self.field_names.clear()
+            name = self.field_names[(key, letter)] = (
+                (letter + '_' if self.typeprefix else '') + (self.prefix or '') + key)
+        return name
+
     def stream(self, records):
         self.logger.info('JsonToFieldsCommand: %s', self)  # logs command line
+        selected = list(self.fieldnames) if self.fieldnames else None
         for record in records:
             json_str = record.get(self.json)
             if json_str:
-                json_obj = json.loads(json_str)
-                if self.prefix:
-                    prefix = self.prefix 
+                json_obj = json_loads(json_str)
+                if selected is None:
+                    items = json_obj.items()
                 else:
-                    prefix = ""
-                for key, value in json_obj.items():
-                    if (not self.fieldnames) or (key in self.fieldnames):
-                        if isinstance(value, str):
-                            if self.typeprefix:
-                                tp = "s_"
-                            else:
-                                tp = ""
-                            record[tp + prefix + key] = value
-                        elif isinstance(value, collections.Mapping):
-                            if self.typeprefix:
-                                tp = "j_"
-                            else:
-                                tp = ""
-                            record[tp + prefix + key] = json.dumps(value)
-                        elif isinstance(value, collections.Sequence):
-                            if self.typeprefix:
-                                tp = "a_"
-                            else:
-                                tp = ""
-                            record[tp + prefix + key] = [ json.dumps(s) for s in value ]
-                        else:
-                            if self.typeprefix:
-                                if isinstance(value, int):
-                                    tp = "i_"
-                                elif isinstance(value, float):
-                                    tp = "f_"
-                                elif isinstance(value, long):
-                                    tp = "l_"
-                                else:
-                                    tp = "x_"
-                            else:
-                                tp = ""
-                            record[tp + prefix + key] = value
+                    items = [(key, json_obj[key]) for key in selected if key in json_obj]
+                for key, value in items:
+                    letter = TYPE_LETTERS.get(type(value)) or type_letter(value)
+                    if letter == 'j':
+                        value = json.dumps(value)
+                    elif letter == 'a':
+                        value = [json.dumps(s) for s in value]
+                    record[self.field_name(key, letter)] = value
             else:
-                self.logger.warn('JsonToFieldsCommand: no field named %s', self.json)
+                self.logger.warning('JsonToFieldsCommand: no field named %s', self.json)
             yield record
 
 dispatch(JsonToFieldsCommand, sys.argv, sys.stdin, sys.stdout, __name__)
-
@@ -43,6 +43,12 @@ class ListAlertsCommand(GeneratingCommand):
         **syntax:** **raw=***<field>*
         **description:** field name that will receive the entire record as a json object.''',
         require=False, name='json', validate=validators.Fieldname())
+    work_log = Option(
+        doc='''
+        **syntax:** **work_log=***<bool>*
+        **description:** If true, the work log of the alerts is joined into the record of the json field (default
+        false, the work log is only read when requested)''',
+        require=False, default=False, validate=validators.Boolean())
     status = Option(
         doc='''
         **syntax:** **status=***<comma_separated_list_of_status>*
@@ -63,7 +69,23 @@ class ListAlertsCommand(GeneratingCommand):
         **syntax:** **analyst=***<comma_separated_list_of_analyst>*
         **description:** Only selects alerts with the provided analysts''',
         require=False)
-    #count = Option(require=True, validate=validators.Integer(0))
+    fields = Option(
+        doc='''
+        **syntax:** **fields=***<comma_separated_list_of_fields>*
+        **description:** Only these top-level alert fields are fetched from the KV store (time is always fetched),
+        other fields are left empty''',
+        require=False)
+    count = Option(
+        doc='''
+        **syntax:** **count=***<integer>*
+        **description:** Maximum number of alerts returned, most recent first (0 returns all alerts)''',
+        require=False, validate=validators.Integer(0))
+    parallel = Option(
+        doc='''
+        **syntax:** **parallel=***<integer>*
+        **description:** Number of concurrent connections used to fetch the alerts, each one reading a time slice
+        of the alerts (default 1, ignored when count is provided)''',
+        require=False, default=1, validate=validators.Integer(1, 16))
     alerts = None
 
     def generate(self):
@@ -94,28 +116,46 @@ class ListAlertsCommand(GeneratingCommand):
             latest_time = self._metadata.searchinfo.latest_time
         else:
             latest_time = None
-        for record in self.alerts.list(status=status, type=type,
+        # work_log is only needed for the full record (alerts not migrated yet still store their work log, updatealerts
+        # moves it to the work log collection), data only when it is output
+        if self.fields:
+            fields = [f.strip() for f in self.fields.split(',') if f.strip()]
+            fields.append('time')
+            if self.data or self.data_prefix is not None:
+                fields.append('data')
+            fields = ','.join(sorted(set(fields)))
+        elif self.json_field:
+            fields = None
+        elif self.data or self.data_prefix is not None:
+            fields = 'work_log:0'
+        else:
+            fields = 'work_log:0,data:0'
+        records = self.alerts.list(status=status, type=type,
                 severity=severity,
                 analyst=analyst,
                 earliest_time=earliest_time, latest_time=latest_time,
-                logger=self.logger):
+                fields=fields,
+                limit=self.count,
+                workers=self.parallel,
+                logger=self.logger)
+        if self.json_field and self.work_log:
+            records = self.alerts.with_work_log(records)
+        for record in records:
             event = {
                 '_time': record['time'],
                 'sourcetype': 'alerts',
-                'type': record['type'],
+                'type': record.get('type'),
                 'severity': record.get('severity'),
-                'entity': record['entity'],
+                'entity': record.get('entity'),
                 'kv_key': record['_key'],
                 'analyst': record.get('analyst'),
-                'status': record['status'],
-                'sid': record['sid']
+                'status': record.get('status'),
+                'sid': record.get('sid')
             }
-            data = record['data']
-
             if self.data:
                 event[self.data] = json.dumps(record['data'])
             if self.data_prefix is not None:
-                for key, value in data.items():
+                for key, value in record['data'].items():
                     event[self.data_prefix + key] = value
             if self.json_field:
                 event[self.json_field] = json.dumps(record)
@@ -21,7 +21,8 @@ from splunklib.searchcommands import dispatch, StreamingCommand, Configuration,
 import sys, json
 from splunklib.client import connect
 from splunklib import results
-from alert_collection import AlertCollection, SearchContext, InsertStats
+from alert_collection import AlertCollection, SearchContext, InsertStats, CombinePolicy
+from multivalue import MultivalueDecoder
 import datetime
 import logging
 
@@ -31,7 +32,7 @@ class CustomLogAdapter(logging.LoggerAdapter):
         return 'sid=%s,type=%s,%s' % (self.extra['sid'], self.extra['type'], msg), kwargs
 
 @Configuration()
-class MakeAlertsCommand(StreamingCommand):
+class MakeAlertsCommand(MultivalueDecoder, StreamingCommand):
     time = Option(
         doc='''
         **Syntax:** **time=***<field>*
@@ -65,7 +66,8 @@ class MakeAlertsCommand(StreamingCommand):
     combine_window = Option(
         doc='''
         **Syntax:** **combine_window=***<string>*
-        **Description:** hours or days. ''',
+        **Description:** How far back alerts are combined: a number of seconds, minutes, hours, days or weeks
+        (30m, 4h, 2d, 1w) or an ISO-8601 duration (PT90M, P1DT12H).''',
         require=False, default=None)
     interactive = Option(
         doc='''
@@ -81,12 +83,20 @@ class MakeAlertsCommand(StreamingCommand):
         require=False, default=False, validate=validators.Boolean())
 
     alerts = None
+    combine_policy = None
 
     def __init__(self):
         super(MakeAlertsCommand, self).__init__()
         self.insert_stats = InsertStats()
         self.loggerExtra = self.logger
 
+    # combine and combine_window are parsed once, an invalid value stops the search before any record is processed
+    def prepare(self):
+        if self.combine or self.combine_window:
+            if not (self.combine and self.combine_window):
+                raise ValueError('combine and combine_window must be used together')
+            self.combine_policy = CombinePolicy(self.combine, self.combine_window)
+
     def is_scheduled(self):
         sid = self._metadata.searchinfo.sid
         return sid.startswith("scheduler_") or sid.startswith("rt_scheduler_")
@@ -104,6 +114,16 @@ class MakeAlertsCommand(StreamingCommand):
         if not self.alerts:
             self.alerts = AlertCollection(self._metadata.searchinfo.session_key)
 
+        # stream is called once per chunk, existing alerts the chunk may duplicate are loaded at once by prefetch
+        # and alerts of the chunk are written together by flush before the records are returned so that idfield
+        # holds the key of the alert
+        records = list(records)
+        self.alerts.prefetch(records,
+            event_time=self.time,
+            entity=self.entity,
+            alert_type=self.alert_type,
+            combine_policy=self.combine_policy,
+            logger=self.loggerExtra)
         for record in records:
             search_context = SearchContext(self._metadata.searchinfo, self.loggerExtra)
             self.alerts.insert(record,
@@ -112,13 +132,14 @@ class MakeAlertsCommand(StreamingCommand):
                 alert_type=self.alert_type,
                 severity=self.severity,
                 idfield=self.idfield,
-                combine=self.combine,
-                combine_window=self.combine_window,
+                combine_policy=self.combine_policy,
                 preview=self.preview,
                 search_context=search_context,
                 insert_stats=self.insert_stats)
             if self.preview:
                 record['preview'] = str(search_context.messages)
+        self.alerts.flush(insert_stats=self.insert_stats, logger=self.loggerExtra)
+        for record in records:
             yield record
 
     def finish(self):
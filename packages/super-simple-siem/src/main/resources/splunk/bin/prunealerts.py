@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright 2016-2017 Jean-Laurent Huynh
+#
+# Licensed under the Apache License, Version 2.0 (the "License"): you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from splunklib.searchcommands import dispatch, GeneratingCommand, Configuration, Option, validators
+import os, sys, time
+from alert_collection import AlertCollection
+
+
+@Configuration(type='streaming', distributed=False, streaming=True)
+class PruneAlertsCommand(GeneratingCommand):
+
+    days = Option(
+        doc='''
+        **syntax:** **days=***<integer>*
+        **description:** Alerts older than this number of days are deleted''',
+        require=True, validate=validators.Integer(1))
+    status = Option(
+        doc='''
+        **syntax:** **status=***<comma_separated_list_of_status>*
+        **description:** Only deletes alerts with the provided statuses (default closed)''',
+        require=False, default='closed')
+    archive = Option(
+        doc='''
+        **syntax:** **archive=***<bool>*
+        **description:** If true, the alerts and their work log are written to a gzip JSON-lines file in
+        $SPLUNK_HOME/var/lib/super_simple_siem/archive before they are deleted''',
+        require=False, default=False, validate=validators.Boolean())
+    alerts = None
+
+    def archive_file(self):
+        directory = os.path.join(os.environ.get('SPLUNK_HOME', ''), 'var', 'lib', 'super_simple_siem', 'archive')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return os.path.join(directory, 'alerts-%s.jsonl.gz' % time.strftime('%Y%m%d%H%M%S'))
+
+    def generate(self):
+        self.logger.info('PruneAlertsCommand: %s', self)
+        if not self.alerts:
+            self.alerts = AlertCollection(self._metadata.searchinfo.session_key)
+        status = [s.strip() for s in self.status.split(',') if s.strip()]
+        archive = self.archive_file() if self.archive else None
+        delete_stats = self.alerts.prune(self.days, status=status, archive=archive, logger=self.logger)
+        self.logger.info('s3tag=stats,%s', delete_stats)
+        yield {
+            '_time': time.time(),
+            'deleted': delete_stats.deleted,
+            'errors': delete_stats.errors,
+            'archive': archive
+        }
+
+dispatch(PruneAlertsCommand, sys.argv, sys.stdin, sys.stdout, __name__)
@@ -30,6 +30,7 @@ import io
 import logging
 import socket
 import ssl
+import threading
 from base64 import b64encode
 from contextlib import contextmanager
 from datetime import datetime
@@ -53,7 +54,8 @@ __all__ = [
     "connect",
     "Context",
     "handler",
-    "HTTPError"
+    "HTTPError",
+    "pooled_handler"
 ]
 
 # If you change these, update the docstring
@@ -1349,21 +1351,8 @@ class ResponseReader(io.RawIOBase):
         return bytes_read
 
 
-def handler(key_file=None, cert_file=None, timeout=None, verify=False, context=None):
-    """This class returns an instance of the default HTTP request handler using
-    the values you provide.
-
-    :param `key_file`: A path to a PEM (Privacy Enhanced Mail) formatted file containing your private key (optional).
-    :type key_file: ``string``
-    :param `cert_file`: A path to a PEM (Privacy Enhanced Mail) formatted file containing a certificate chain file (optional).
-    :type cert_file: ``string``
-    :param `timeout`: The request time-out period, in seconds (optional).
-    :type timeout: ``integer`` or "None"
-    :param `verify`: Set to False to disable SSL verification on https connections.
-    :type verify: ``Boolean``
-    :param `context`: The SSLContext that can is used with the HTTPSConnection when verify=True is enabled and context is specified
-    :type context: ``SSLContext`
-    """
+def _connector(key_file=None, cert_file=None, timeout=None, verify=False, context=None):
+    """Returns a function opening a new connection for a scheme, host and port, see :func:`handler`."""
 
     def connect(scheme, host, port):
         kwargs = {}
@@ -1383,6 +1372,146 @@ def handler(key_file=None, cert_file=None, timeout=None, verify=False, context=N
             return six.moves.http_client.HTTPSConnection(host, port, **kwargs)
         raise ValueError("unsupported scheme: %s" % scheme)
 
+    return connect
+
+
+class ConnectionPool(object):
+    """Idle keep-alive connections by (scheme, host, port), shared by the threads of the process.
+
+    A connection is used by one request at a time: :meth:`acquire` removes it from the pool and
+    :meth:`release` puts it back, or closes it when ``pool_size`` connections to the same server are
+    already idle.
+    """
+    def __init__(self, connect, pool_size=8):
+        self._connect = connect
+        self.pool_size = pool_size
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme, host, port):
+        """Returns a ``(connection, reused)`` tuple, ``reused`` is False for a new connection."""
+        with self._lock:
+            idle = self._idle.get((scheme, host, port))
+            if idle:
+                return idle.pop(), True
+        return self._connect(scheme, host, port), False
+
+    def release(self, scheme, host, port, connection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host, port), [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        """Closes all the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def pooled_handler(key_file=None, cert_file=None, timeout=None, verify=False, context=None, pool_size=8):
+    """Returns an HTTP request handler like :func:`handler` that keeps connections alive and reuses them.
+
+    Connections are pooled per (scheme, host, port), at most ``pool_size`` idle connections are kept for each.
+    A pooled connection that splunkd has closed in the meantime is discarded and the request is sent again on
+    a new connection, only when the failure shows the request was not processed: an error while sending it, or
+    no status line at all in response. Timeouts are never retried. The response body is read before the connection goes back to the pool, so this handler
+    is meant for REST calls rather than for streaming large search results.
+
+    The handler can be shared by several :class:`Context` objects and threads, its pool is available as
+    ``handler.pool``. Parameters are the same as :func:`handler`, plus:
+
+    :param `pool_size`: The maximum number of idle connections kept per server.
+    :type pool_size: ``integer``
+    """
+    pool = ConnectionPool(_connector(key_file, cert_file, timeout, verify, context), pool_size)
+
+    def request(url, message, **kwargs):
+        scheme, host, port, path = _spliturl(url)
+        body = message.get("body", "")
+        head = {
+            "Content-Length": str(len(body)),
+            "Host": host,
+            "User-Agent": "splunk-sdk-python/1.6.18",
+            "Accept": "*/*",
+            "Connection": "Keep-Alive",
+        } # defaults
+        for key, value in message["headers"]:
+            head[key] = value
+        method = message.get("method", "GET")
+
+        while True:
+            connection, reused = pool.acquire(scheme, host, port)
+            try:
+                connection.request(method, path, body, head)
+            except socket.timeout:
+                connection.close()
+                raise
+            except (socket.error, six.moves.http_client.HTTPException):
+                connection.close()
+                if reused:
+                    # the idle connection was closed by the server before the request went out, retry on a new one
+                    continue
+                raise
+            try:
+                if timeout is not None:
+                    connection.sock.settimeout(timeout)
+                response = connection.getresponse()
+            except six.moves.http_client.BadStatusLine:
+                # the server closed the idle connection without answering (RemoteDisconnected is a BadStatusLine),
+                # other failures past this point may come after the request was processed and are not retried
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            try:
+                content = response.read()
+            except Exception:
+                connection.close()
+                raise
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            pool.release(scheme, host, port, connection)
+
+        return {
+            "status": response.status,
+            "reason": response.reason,
+            "headers": response.getheaders(),
+            "body": ResponseReader(BytesIO(content)),
+        }
+
+    request.pool = pool
+    return request
+
+
+def handler(key_file=None, cert_file=None, timeout=None, verify=False, context=None):
+    """This class returns an instance of the default HTTP request handler using
+    the values you provide.
+
+    :param `key_file`: A path to a PEM (Privacy Enhanced Mail) formatted file containing your private key (optional).
+    :type key_file: ``string``
+    :param `cert_file`: A path to a PEM (Privacy Enhanced Mail) formatted file containing a certificate chain file (optional).
+    :type cert_file: ``string``
+    :param `timeout`: The request time-out period, in seconds (optional).
+    :type timeout: ``integer`` or "None"
+    :param `verify`: Set to False to disable SSL verification on https connections.
+    :type verify: ``Boolean``
+    :param `context`: The SSLContext that can is used with the HTTPSConnection when verify=True is enabled and context is specified
+    :type context: ``SSLContext`
+    """
+
+    connect = _connector(key_file, cert_file, timeout, verify, context)
+
     def request(url, message, **kwargs):
         scheme, host, port, path = _spliturl(url)
         body = message.get("body", "")
@@ -2,33 +2,38 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 import json, logging, sys, gzip, csv
 from logging import getLogger
-from alert_collection import AlertCollection
+from alert_collection import AlertCollection, InsertStats
+from multivalue import decode_mv
 
 logger = getLogger('super_simple_siem_alert')
 
-def parse_mv_field(s):
-    # s appears to be utf-8 encoded
-    # need to work on unicode char set and assume we need to give back utf-8
-    res = []
-    if (not s) or (s[0] != '$' and s[-1] != '$') :
-        return res
-    else:
-        f = ''
-        i = 1 # first and last char will be $
-        ss = s.decode('utf-8')
-        while i < len(ss) - 1:
-            if ss[i:(i+2)] == '$$':
-                f += '$'
-                i += 2
-            elif ss[i:(i+3)] == '$;$':
-                res.append(f.encode('utf-8'))
-                f = ''
-                i += 3
-            else:
-                f += ss[i]
-                i += 1
-        res.append(f.encode('utf-8'))
-        return res
+# records of the gzipped results file, read one row at a time and at most max_count when it is positive.
+# a field with a non empty __mv_ column is replaced by the list of its values.
+def read_results(results_file, max_count=0):
+    with gzip.open(results_file, 'rt') as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if not header:
+            return
+        columns = [(i, k) for i, k in enumerate(header) if not k.startswith('__mv_')]
+        mv_columns = dict((k[len('__mv_'):], i) for i, k in enumerate(header) if k.startswith('__mv_'))
+        mv_columns = [(k, mv_columns[k]) for i, k in columns if k in mv_columns]
+        count = 0
+        for row in rows:
+            if max_count > 0 and count >= max_count:
+                break
+            count += 1
+            if len(row) < len(header):
+                row = row + [''] * (len(header) - len(row))
+            record = dict((k, row[i]) for i, k in columns)
+            # if fields has a multi-value version,  replace with array
+            for k, i in mv_columns:
+                if row[i]:
+                    try:
+                        record[k] = decode_mv(row[i])
+                    except ValueError as e:
+                        logger.error('Could not parse multivalue %s', e)
+            yield record
 
 payload = json.loads(sys.stdin.read())
 
@@ -40,44 +45,28 @@ alerts = AlertCollection(session_key)
 
 results_file = payload['results_file']
 
-with gzip.open(results_file, 'rt') as f:
-    file_content = csv.reader(f)
-    lines = list(file_content)
-    header = lines[0]
-    rows = lines[1:]
+insert_stats = InsertStats()
 
-    # cap how many alerts can be created if it is defined
-    if max_count > 0:
-        rows = rows[0:max_count]
-
-    for row in rows:
-        record_all = dict(zip(header, row))
-        record = {k:v for k,v in record_all.items() if not k.startswith('__mv_')}
-        # if fields has a multi-value version,  replace with array
-        for k in record.keys():
-            mvname = '__mv_' + k
-            if (mvname in record_all) and (record_all[mvname]):
-                try:
-                    mvvalue = parse_mv_field(record_all[mvname])
-                    if mvvalue:
-                        record[k] = mvvalue
-                except:
-                    logger.error('Could not parse multivalue ' + str(record_all[mvname]))
-
-        alerts.insert_custom_alert(
-            record = record,
-            event_time=payload['configuration']['time'],
-            entity=payload['configuration']['entity'],
-            alert_type=payload['configuration']['type'],
-            severity=payload['configuration']['severity'],
-            app=payload['app'],
-            owner=payload['owner'],
-            search_name=payload['search_name'],
-            sid=payload['sid'],
-            server_host=payload['server_host'],
-            server_uri=payload['server_uri'],
-            search_uri=payload['search_uri'],
-            results_link=payload['results_link'],
-            logger=logger
-        )
+# cap how many alerts can be created if it is defined
+for record in read_results(results_file, max_count):
+    alerts.insert_custom_alert(
+        record = record,
+        event_time=payload['configuration']['time'],
+        entity=payload['configuration']['entity'],
+        alert_type=payload['configuration']['type'],
+        severity=payload['configuration']['severity'],
+        app=payload['app'],
+        owner=payload['owner'],
+        search_name=payload['search_name'],
+        sid=payload['sid'],
+        server_host=payload['server_host'],
+        server_uri=payload['server_uri'],
+        search_uri=payload['search_uri'],
+        results_link=payload['results_link'],
+        logger=logger,
+        insert_stats=insert_stats
+    )
+alerts.flush(insert_stats=insert_stats, logger=logger)
+logger.info('sid=%s,search_name="%s",inserted=%d,failed=%d',
+    payload['sid'], payload['search_name'], insert_stats.inserted, insert_stats.errors)
 
@@ -21,9 +21,10 @@ from splunklib.searchcommands import dispatch, StreamingCommand, Configuration,
 import sys, json
 from splunklib.client import connect
 from alert_collection import AlertCollection
+from multivalue import MultivalueDecoder
 
 @Configuration()
-class UpdateAlertsCommand(StreamingCommand):
+class UpdateAlertsCommand(MultivalueDecoder, StreamingCommand):
 
     json = Option(
         doc='''
@@ -62,6 +63,8 @@ class UpdateAlertsCommand(StreamingCommand):
         require=False, validate=validators.Fieldname())
 
     alerts = None
+    # alerts of the status changes that were not written (not found or changed concurrently too many times)
+    failed = 0
 
     def stream(self, records):
         self.logger.info('UpdateAlertsCommand: %s', self)  # logs command line
@@ -69,6 +72,9 @@ class UpdateAlertsCommand(StreamingCommand):
         if not self.alerts:
             self.alerts = AlertCollection(self._metadata.searchinfo.session_key)
 
+        # status changes of the chunk are written together by update_many once the chunk is read
+        records = list(records)
+        updates = []
         for record in records:
             if self.json and self.json in record:
                 self.alerts.replace(json.loads(record[self.json]),
@@ -76,20 +82,31 @@ class UpdateAlertsCommand(StreamingCommand):
                     logger=self.logger,
                     sid=self._metadata.searchinfo.sid,
                     username=self._metadata.searchinfo.username)
-            elif self.action and self.status and self.key and self.key in record:
+            elif self.action and self.status and self.key and record.get(self.key):
                 notes = None
                 if self.notes:
                     notes = self.notes
                 if self.notes_field and self.notes_field in record and record[self.notes_field]:
                     notes = record[self.notes_field]
-                self.alerts.update(record[self.key], action=self.action, status=self.status, notes=notes,
-                    logger=self.logger,
-                    sid=self._metadata.searchinfo.sid,
-                    username=self._metadata.searchinfo.username)
+                updates.append((record[self.key], self.action, self.status, notes))
             else:
                 self.logger.error('json field should be present OR the key field, action value and status value should be provided')
+        if updates:
+            updated = self.alerts.update_many(updates,
+                logger=self.logger,
+                sid=self._metadata.searchinfo.sid,
+                username=self._metadata.searchinfo.username)
+            self.failed += len(set(key for key, action, status, notes in updates)) - updated
 
+        for record in records:
             yield record
 
+    def finish(self):
+        if self.failed > 0:
+            self.write_error(
+                "There were {0} alert(s) that could not be updated, check logs with this search 'index=_internal UpdateAlertsCommand source=*super_simple_siem.log* ERROR'",
+                self.failed)
+        super(UpdateAlertsCommand, self).finish()
+
 dispatch(UpdateAlertsCommand, sys.argv, sys.stdin, sys.stdout, __name__)
 
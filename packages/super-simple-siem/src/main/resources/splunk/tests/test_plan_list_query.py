@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright 2016-2017 Jean-Laurent Huynh
+#
+# Licensed under the Apache License, Version 2.0 (the "License"): you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# python -m unittest discover -s tests (from the directory of bin)
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin'))
+
+from alert_collection import plan_list_query
+
+NO_FILTERS = {'status': [], 'type': [], 'severity': [], 'analyst': [], 'entity': []}
+
+def filters(**values):
+    f = dict(NO_FILTERS)
+    f.update(values)
+    return f
+
+class PlanListQueryTest(unittest.TestCase):
+
+    def test_no_filter(self):
+        self.assertEqual(plan_list_query(filters()), {})
+
+    def test_single_value_is_an_equality(self):
+        self.assertEqual(plan_list_query(filters(status=['open'])), {'status': 'open'})
+
+    def test_several_values_are_an_in_without_duplicates(self):
+        self.assertEqual(plan_list_query(filters(status=['open', 'assigned', 'open'])),
+            {'status': {'$in': ['open', 'assigned']}})
+
+    def test_duplicates_of_a_single_value_are_an_equality(self):
+        self.assertEqual(plan_list_query(filters(type=['ioc', 'ioc'])), {'type': 'ioc'})
+
+    def test_time_range_is_one_clause(self):
+        self.assertEqual(plan_list_query(filters(), earliest_time=10, latest_time=20),
+            {'time': {'$gte': 10, '$lt': 20}})
+        self.assertEqual(plan_list_query(filters(), earliest_time=10), {'time': {'$gte': 10}})
+        self.assertEqual(plan_list_query(filters(), latest_time=20), {'time': {'$lt': 20}})
+
+    def test_time_range_comes_last(self):
+        self.assertEqual(plan_list_query(filters(status=['open']), earliest_time=10, latest_time=20),
+            {'$and': [{'status': 'open'}, {'time': {'$gte': 10, '$lt': 20}}]})
+
+    def test_clauses_are_ordered_by_selectivity(self):
+        query = plan_list_query(filters(status=['open'], severity=['high'], analyst=['bob'], type=['ioc'],
+            entity=['host1']))
+        self.assertEqual(query, {'$and': [
+            {'entity': 'host1'}, {'type': 'ioc'}, {'analyst': 'bob'}, {'severity': 'high'}, {'status': 'open'}]})
+
+    def test_more_values_are_less_selective(self):
+        # 5 types (0.25) are less selective than one analyst (0.1)
+        query = plan_list_query(filters(type=['a', 'b', 'c', 'd', 'e'], analyst=['bob']))
+        self.assertEqual(query, {'$and': [{'analyst': 'bob'}, {'type': {'$in': ['a', 'b', 'c', 'd', 'e']}}]})
+
+    def test_single_clause_is_not_wrapped(self):
+        self.assertEqual(plan_list_query(filters(entity=['host1', 'host2'])),
+            {'entity': {'$in': ['host1', 'host2']}})
+
+if __name__ == '__main__':
+    unittest.main()